@@ -1,6 +1,8 @@
+import hashlib
 import json
 import os
-import random
+import threading
+import time
 from typing import Counter
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify
@@ -8,6 +10,13 @@ import openai
 import requests
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from cache import SingleFlight, TTLCache
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from ranking import prefilter_tracks
+from playlist_store import create_playlist_store, update_playlist_record
+from profiling import RequestProfiler
+from relevance import score_tracks, select_candidates
+from scheduler import PRIORITIES, QuotaExceededError, QuotaScheduler, SchedulerBusyError
 
 # Load environment variables
 load_dotenv()
@@ -25,6 +34,8 @@ SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
 client = openai.OpenAI(
     # This is the default and can be omitted
     api_key=os.environ.get("OPENAI_API_KEY"),
+    # No SDK retries: the OpenAI circuit breaker decides when to try again
+    max_retries=0,
 )
 
 # Initialize Spotify client
@@ -33,10 +44,179 @@ spotify = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
     client_secret=SPOTIFY_CLIENT_SECRET
 ))
 
+# Upstream timeouts (seconds)
+SUNO_TIMEOUT = float(os.getenv('SUNO_TIMEOUT', '30'))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '20'))
+
+# Circuit breakers for slow or failing upstreams
+suno_breaker = CircuitBreaker(
+    'suno',
+    failure_threshold=int(os.getenv('SUNO_BREAKER_FAILURES', '3')),
+    recovery_timeout=float(os.getenv('SUNO_BREAKER_RECOVERY', '60')),
+    slow_call_threshold=float(os.getenv('SUNO_BREAKER_SLOW_CALL', '20'))
+)
+openai_breaker = CircuitBreaker(
+    'openai',
+    failure_threshold=int(os.getenv('OPENAI_BREAKER_FAILURES', '5')),
+    recovery_timeout=float(os.getenv('OPENAI_BREAKER_RECOVERY', '30')),
+    slow_call_threshold=float(os.getenv('OPENAI_BREAKER_SLOW_CALL', '10'))
+)
+# Quota lookups get their own breaker so cheap /api/get_limit successes
+# never reset or close the circuit guarding generation
+suno_quota_breaker = CircuitBreaker(
+    'suno_quota',
+    failure_threshold=int(os.getenv('SUNO_BREAKER_FAILURES', '3')),
+    recovery_timeout=float(os.getenv('SUNO_BREAKER_RECOVERY', '60')),
+    slow_call_threshold=float(os.getenv('SUNO_BREAKER_SLOW_CALL', '20'))
+)
+
+# Last good lyric analyses, served when OpenAI is unavailable
+analysis_cache = TTLCache(
+    maxsize=int(os.getenv('ANALYSIS_CACHE_SIZE', '5000')),
+    ttl=float(os.getenv('ANALYSIS_CACHE_TTL', '86400'))
+)
+
+# Generated songs by normalized prompt, so repeated prompts use no Suno quota
+song_cache = TTLCache(
+    maxsize=int(os.getenv('SONG_CACHE_SIZE', '1000')),
+    ttl=float(os.getenv('SONG_CACHE_TTL', '21600'))
+)
+song_generations = SingleFlight()
+
+# Request counts per mood/activity pair, used to pick songs to pre-warm
+generation_requests = Counter()
+generation_requests_lock = threading.Lock()
+SONG_PREWARM_LIMIT = int(os.getenv('SONG_PREWARM_LIMIT', '5'))
+
+# Playlist genre histograms keyed by playlist id, refreshed incrementally by snapshot_id
+playlist_store = create_playlist_store(
+    os.getenv('REDIS_URL'),
+    ttl=float(os.getenv('PLAYLIST_STORE_TTL', '604800'))
+)
+
+# Token required by admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Candidate pool for analyze-songs: genres searched, results per page and pages per genre
+ANALYZE_MAX_GENRES = int(os.getenv('ANALYZE_MAX_GENRES', '5'))
+SEARCH_LIMIT = int(os.getenv('SEARCH_LIMIT', '50'))
+SEARCH_PAGES = int(os.getenv('SEARCH_PAGES', '4'))
+
+# First-stage prefilter: tracks kept for analysis, per-artist cap and feature weights
+PREFILTER_TOP_K = int(os.getenv('PREFILTER_TOP_K', '10'))
+MAX_TRACKS_PER_ARTIST = int(os.getenv('MAX_TRACKS_PER_ARTIST', '1'))
+PREFILTER_WEIGHTS = {
+    'popularity': float(os.getenv('PREFILTER_POPULARITY_WEIGHT', '0.4')),
+    'track_genres': float(os.getenv('PREFILTER_TRACK_GENRES_WEIGHT', '0.3')),
+    'artist_genres': float(os.getenv('PREFILTER_ARTIST_GENRES_WEIGHT', '0.3'))
+}
+
+# Tracks sent to the LLM per request; the rest keep their local relevance scores
+LLM_TOP_K = int(os.getenv('LLM_TOP_K', '5'))
+# Local score distance from the top-k cutoff within which a track still goes to the LLM
+LOCAL_SCORE_MARGIN = float(os.getenv('LOCAL_SCORE_MARGIN', '1'))
+
 def custom_generate_audio(payload):
     url = f"{base_url}/api/custom_generate"
-    response = requests.post(url, json=payload, headers={'Content-Type': 'application/json'})
-    return response.json()
+
+    def post():
+        response = requests.post(url, json=payload, headers={'Content-Type': 'application/json'}, timeout=SUNO_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    return suno_breaker.call(post)
+
+def get_quota_information():
+    url = f"{base_url}/api/get_limit"
+
+    def get():
+        response = requests.get(url, timeout=SUNO_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    return suno_quota_breaker.call(get)
+
+# Admits Suno generations by remaining credits, priority and concurrency
+generation_scheduler = QuotaScheduler(
+    lambda: get_quota_information(),
+    cost_per_generation=int(os.getenv('SUNO_GENERATION_COST', '10')),
+    refresh_interval=float(os.getenv('SUNO_QUOTA_REFRESH', '60')),
+    max_concurrent=int(os.getenv('SUNO_MAX_CONCURRENT', '4')),
+    max_queue=int(os.getenv('SUNO_MAX_QUEUE', '16')),
+    queue_timeout=float(os.getenv('SUNO_QUEUE_TIMEOUT', '30')),
+    low_priority_reserve=int(os.getenv('SUNO_LOW_PRIORITY_RESERVE', '20'))
+)
+
+def generation_error_response(e):
+    # Maps scheduler and circuit errors to a client-facing response
+    if isinstance(e, QuotaExceededError):
+        return jsonify({
+            "error": f"Song generation quota exhausted: {str(e)}",
+            "status": "quota_exhausted",
+            "credits_left": e.credits_left
+        }), 429
+    if isinstance(e, SchedulerBusyError):
+        response = jsonify({"error": f"Song generation busy: {str(e)}", "status": "queue_full"})
+    else:
+        response = jsonify({"error": f"Song generation temporarily unavailable: {str(e)}", "status": "unavailable"})
+    response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+    return response, 503
+
+def require_admin():
+    # Returns an error response unless the request carries the admin token
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled"}), 403
+    if request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Invalid admin token"}), 403
+    return None
+
+# Opt-in request profiling: sampled by PROFILING_SAMPLE_RATE, or forced with
+# an "X-Profile: 1" header on requests that carry the admin token
+profiler = RequestProfiler(
+    mode=os.getenv('PROFILING_MODE', 'cprofile'),
+    sample_rate=float(os.getenv('PROFILING_SAMPLE_RATE', '0')),
+    interval=float(os.getenv('PROFILING_INTERVAL', '0.005'))
+)
+profiler.init_app(app, force=lambda: request.headers.get('X-Profile') == '1' and require_admin() is None)
+
+def normalize_prompt_text(text):
+    return ' '.join(str(text).lower().split())
+
+def song_prompt(mood, activity, personal_details):
+    return f"A song that captures the mood of {mood}, while doing {activity}. {personal_details}"
+
+def generate_song_result(prompt, priority='normal'):
+    # Returns (result, cached); identical in-flight prompts share one Suno request and one quota slot
+    key = hashlib.sha256(normalize_prompt_text(prompt).encode('utf-8')).hexdigest()
+    cached = song_cache.get(key)
+    if cached is not None:
+        return cached, True
+
+    def generate():
+        payload = {
+            "prompt": prompt,
+            "make_instrumental": False,
+            "wait_audio": False
+        }
+
+        with generation_scheduler.slot(priority):
+            response = custom_generate_audio(payload)
+        if not response or len(response) == 0:
+            return None
+
+        song_data_0 = response[0].get('0', {})
+        song_data_1 = response[0].get('1', {})
+        result = {
+            "id_0": song_data_0.get('id', ''),
+            "audio_url_0": song_data_0.get('audio_url', ''),
+            "id_1": song_data_1.get('id', ''),
+            "audio_url_1": song_data_1.get('audio_url', '')
+        }
+        if result['id_0']:
+            song_cache.set(key, result)
+        return result
+
+    return song_generations.do(key, generate), False
 
 @app.route('/api/recommend', methods=['POST'])
 def recommend_songs():
@@ -98,40 +278,134 @@ def generate_song():
         mood = data['mood']
         activity = data['activity']
         personal_details = data['personal_details']
+        priority = data.get('priority', 'normal')
+        if priority not in PRIORITIES:
+            return jsonify({"error": f"Invalid input: priority must be one of {', '.join(PRIORITIES)}"}), 400
+
+        # Track demand for pre-warming, keeping only the most common pairs once the counter grows large
+        with generation_requests_lock:
+            generation_requests[(normalize_prompt_text(mood), normalize_prompt_text(activity))] += 1
+            if len(generation_requests) > 10000:
+                top_pairs = generation_requests.most_common(1000)
+                generation_requests.clear()
+                generation_requests.update(dict(top_pairs))
 
         # Compile prompt
-        prompt = f"A song that captures the mood of {mood}, while doing {activity}. {personal_details}"
+        prompt = song_prompt(mood, activity, personal_details)
 
-        # Generate song
-        payload = {
-            "prompt": prompt,
-            "make_instrumental": False,
-            "wait_audio": False
-        }
-        
-        response = custom_generate_audio(payload)
-
-        # Extract relevant information
-        if response and len(response) > 0:
-            song_data_0 = response[0].get('0', {})
-            song_data_1 = response[0].get('1', {})
-            
-            return jsonify({
-                "id_0": song_data_0.get('id', ''),
-                "audio_url_0": song_data_0.get('audio_url', ''),
-                "id_1": song_data_1.get('id', ''),
-                "audio_url_1": song_data_1.get('audio_url', '')
-            })
+        # Generate song, or reuse a cached generation of the same prompt
+        result, cached = generate_song_result(prompt, priority)
+
+        if result:
+            response = jsonify(result)
+            response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+            return response
         else:
             return jsonify({"error": "Failed to generate song"}), 500
 
     except KeyError as e:
         return jsonify({"error": f"Invalid input: missing key {str(e)}"}), 400
+    except (CircuitOpenError, QuotaExceededError, SchedulerBusyError) as e:
+        return generation_error_response(e)
     except requests.RequestException as e:
         return jsonify({"error": f"API request failed: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@app.route('/api/generation-status', methods=['GET'])
+def generation_status():
+    try:
+        return jsonify(generation_scheduler.snapshot())
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+@app.route('/api/admin/profiles', methods=['GET', 'DELETE'])
+def profiles():
+    error = require_admin()
+    if error:
+        return error
+
+    try:
+        if request.method == 'DELETE':
+            profiler.reset()
+            return jsonify({"status": "reset"})
+
+        endpoint = request.args.get('endpoint')
+
+        # Folded stacks (sampling mode) can be fed to flamegraph.pl or speedscope
+        if request.args.get('format') == 'folded':
+            if not endpoint:
+                return jsonify({"error": "Invalid input: folded format requires an endpoint"}), 400
+            return app.response_class(profiler.folded_stacks(endpoint), mimetype='text/plain')
+
+        return jsonify(profiler.report(endpoint, request.args.get('limit', 20, type=int)))
+
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+@app.route('/api/prewarm-songs', methods=['POST'])
+def prewarm_songs():
+    error = require_admin()
+    if error:
+        return error
+
+    try:
+        data = request.get_json(silent=True) or {}
+
+        # Default to the most requested mood/activity pairs
+        pairs = data.get('pairs')
+        if pairs is None:
+            limit = data.get('limit', SONG_PREWARM_LIMIT)
+            if not isinstance(limit, int) or isinstance(limit, bool) or limit < 0:
+                return jsonify({"error": "Invalid input: limit must be a non-negative integer"}), 400
+            with generation_requests_lock:
+                top_pairs = generation_requests.most_common(limit)
+            pairs = [{"mood": mood, "activity": activity} for (mood, activity), _ in top_pairs]
+        elif not isinstance(pairs, list) or not all(
+            isinstance(pair, dict) and isinstance(pair.get('mood'), str) and isinstance(pair.get('activity'), str)
+            for pair in pairs
+        ):
+            return jsonify({"error": "Invalid input: pairs must be a list of objects with string mood and activity"}), 400
+
+        # Pre-warmed songs serve requests with empty personal details
+        # Pre-warming runs at low priority so it never uses the credits reserved for users
+        warmed = []
+        for pair in pairs:
+            try:
+                result, cached = generate_song_result(song_prompt(pair['mood'], pair['activity'], ''), 'low')
+                status = "cached" if cached else ("generated" if result else "failed")
+            except QuotaExceededError:
+                status = "quota_exhausted"
+            except SchedulerBusyError:
+                status = "queue_full"
+            except CircuitOpenError:
+                status = "unavailable"
+            except Exception:
+                # Any other upstream or parsing error only fails this pair
+                status = "failed"
+            warmed.append({
+                "mood": pair['mood'],
+                "activity": pair['activity'],
+                "status": status
+            })
+
+        return jsonify({"warmed": warmed})
+
+    except KeyError as e:
+        return jsonify({"error": f"Invalid input: missing key {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+def fetch_artist_genres(artist_ids):
+    # Get genres for the given artists, 50 per request
+    artist_genres = {}
+    for i in range(0, len(artist_ids), 50):
+        artists = spotify.artists(artist_ids[i:i+50])
+        for artist in artists['artists']:
+            if artist:
+                artist_genres[artist['id']] = artist['genres']
+    return artist_genres
+
 @app.route('/api/playlist-genres', methods=['POST'])
 def playlist_genres():
     try:
@@ -146,39 +420,36 @@ def playlist_genres():
         # Extract playlist ID from URL
         playlist_id = playlist_url.split('/')[-1].split('?')[0]
 
-        # Get playlist tracks
-        results = spotify.playlist_tracks(playlist_id)
-        tracks = results['items']
-
-        # Get more tracks if the playlist has more than 100 songs
-        while results['next']:
-            results = spotify.next(results)
-            tracks.extend(results['items'])
-
-        # Extract artist IDs
-        artist_ids = set()
-        for track in tracks:
-            for artist in track['track']['artists']:
-                artist_ids.add(artist['id'])
+        # Return the stored histogram when the playlist has not changed
+        snapshot_id = spotify.playlist(playlist_id, fields='snapshot_id')['snapshot_id']
+        record = playlist_store.get(playlist_id)
+        if record and record['snapshot_id'] == snapshot_id:
+            cache_status = 'HIT'
+        else:
+            # Get playlist tracks, only the fields needed to diff them
+            results = spotify.playlist_tracks(playlist_id, fields='items(track(id,uri,artists(id))),next')
+            tracks = results['items']
 
-        # Get genres for all artists
-        all_genres = []
-        for i in range(0, len(artist_ids), 50):
-            artists = spotify.artists(list(artist_ids)[i:i+50])
-            for artist in artists['artists']:
-                all_genres.extend(artist['genres'])
+            # Get more tracks if the playlist has more than 100 songs
+            while results['next']:
+                results = spotify.next(results)
+                tracks.extend(results['items'])
 
-        # Count genre occurrences
-        genre_counts = Counter(all_genres)
+            # Apply added and removed tracks to the stored genre counts
+            cache_status = 'INCREMENTAL' if record else 'MISS'
+            record = update_playlist_record(record, snapshot_id, tracks, fetch_artist_genres)
+            playlist_store.set(playlist_id, record)
 
         # Sort genres by count and get the top 10
-        top_10_genres = dict(sorted(genre_counts.items(), key=lambda x: x[1], reverse=True)[:10])
+        top_10_genres = dict(sorted(record['genre_counts'].items(), key=lambda x: x[1], reverse=True)[:10])
 
-        return jsonify({
+        response = jsonify({
             "playlist_id": playlist_id,
-            "total_tracks": len(tracks),
+            "total_tracks": record['total_tracks'],
             "genres": top_10_genres
         })
+        response.headers['X-Cache'] = cache_status
+        return response
 
     except spotipy.SpotifyException as e:
         return jsonify({"error": f"Spotify API error: {str(e)}"}), 500
@@ -192,7 +463,31 @@ def get_song_lyrics(track_name, artist_name):
     # This is a placeholder function. In a real-world scenario, you would use a lyrics API or web scraping to get the lyrics.
     # For this example, we'll return a dummy lyrics string.
     return f"This is a placeholder for the lyrics of {track_name} by {artist_name}."
-def analyze_lyrics(lyrics, mood, activity, personal_status):
+
+def local_analysis(scores, explanation):
+    # Same structure as analyze_lyrics, built from local mood/activity/personal scores
+    return {
+        "mood_relevance_score": int(scores[0]),
+        "activity_relevance_score": int(scores[1]),
+        "personal_relevance_score": int(scores[2]),
+        "summary": explanation,
+        "mood_explanation": explanation,
+        "activity_explanation": explanation,
+        "personal_explanation": explanation
+    }
+
+def heuristic_analysis(lyrics, mood, activity, personal_status, scores=None):
+    # Local relevance scores used when no LLM analysis is available; callers that
+    # already scored the track pass its row to avoid embedding it again
+    if scores is None:
+        scores = score_tracks([lyrics], mood, activity, personal_status)[0]
+    return local_analysis(scores, "Detailed analysis is temporarily unavailable, scored locally from lyric similarity")
+
+def analysis_cache_key(lyrics, mood, activity, personal_status):
+    raw = json.dumps([lyrics, mood, activity, personal_status])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def analyze_lyrics(lyrics, mood, activity, personal_status, local_scores=None):
     prompt = f"""
     Analyze the following song lyrics in the context of the given mood, activity, and personal status:
 
@@ -214,16 +509,26 @@ def analyze_lyrics(lyrics, mood, activity, personal_status):
     }}
     """
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that analyzes song lyrics and provides responses in JSON format."},
-            {"role": "user", "content": prompt}
-        ]
-    )
+    cache_key = analysis_cache_key(lyrics, mood, activity, personal_status)
+
+    try:
+        response = openai_breaker.call(
+            client.chat.completions.create,
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that analyzes song lyrics and provides responses in JSON format."},
+                {"role": "user", "content": prompt}
+            ],
+            timeout=OPENAI_TIMEOUT
+        )
+    except (CircuitOpenError, openai.OpenAIError):
+        # Open circuit or failed call: degrade to the last good analysis, or heuristic scores if there is none
+        analysis = analysis_cache.get(cache_key) or heuristic_analysis(lyrics, mood, activity, personal_status, local_scores)
+        return dict(analysis, degraded=True)
 
     try:
-        analysis = json.loads(response.choices[0].message['content'])
+        analysis = json.loads(response.choices[0].message.content)
+        analysis_cache.set(cache_key, analysis)
         return analysis
     except json.JSONDecodeError:
         return {
@@ -246,36 +551,52 @@ def analyze_songs():
         if not all(field in data for field in required_fields):
             return jsonify({"error": "Invalid input: missing required fields"}), 400
 
-        genres = data['genres'][:5]  # Limit to top 5 genres
+        genres = data['genres'][:ANALYZE_MAX_GENRES]
         mood = data['mood']
         activity = data['activity']
         personal_status = data['personal_status']
 
-        # Get tracks for each genre
+        # Stage 0: build the candidate pool from several search pages per genre
+        start = time.perf_counter()
         all_tracks = []
+        track_genres = {}
         for genre in genres:
-            results = spotify.search(q=f'genre:"{genre}"', type='track', limit=50)
-            all_tracks.extend(results['tracks']['items'])
-
-        # Shuffle and select 10 unique tracks
-        random.shuffle(all_tracks)
-        selected_tracks = []
-        seen_tracks = set()
-        for track in all_tracks:
-            track_id = track['id']
-            if track_id not in seen_tracks and len(selected_tracks) < 10:
-                selected_tracks.append(track)
-                seen_tracks.add(track_id)
-            if len(selected_tracks) == 10:
-                break
+            for page in range(SEARCH_PAGES):
+                results = spotify.search(q=f'genre:"{genre}"', type='track', limit=SEARCH_LIMIT, offset=page * SEARCH_LIMIT)
+                for track in results['tracks']['items']:
+                    if track['id'] not in track_genres:
+                        all_tracks.append(track)
+                        track_genres[track['id']] = set()
+                    track_genres[track['id']].add(genre)
+                if not results['tracks'].get('next'):
+                    break
+        fetch_time = time.perf_counter() - start
+
+        # Stage 1: cheap metadata prefilter down to the tracks worth analyzing
+        start = time.perf_counter()
+        selected_tracks = prefilter_tracks(
+            all_tracks, track_genres, genres,
+            top_k=PREFILTER_TOP_K,
+            max_per_artist=MAX_TRACKS_PER_ARTIST,
+            weights=PREFILTER_WEIGHTS
+        )
+        prefilter_time = time.perf_counter() - start
+
+        # Stage 2: score the prefiltered tracks locally and only send the best or borderline ones to the LLM
+        start = time.perf_counter()
+        lyrics_list = [get_song_lyrics(track['name'], track['artists'][0]['name']) for track in selected_tracks]
+        local_scores = score_tracks(lyrics_list, mood, activity, personal_status)
+        llm_candidates = set(select_candidates(local_scores, LLM_TOP_K, LOCAL_SCORE_MARGIN).tolist())
 
         # Analyze each track
         analyzed_tracks = []
-        for track in selected_tracks:
+        for i, track in enumerate(selected_tracks):
             track_name = track['name']
             artist_name = track['artists'][0]['name']
-            lyrics = get_song_lyrics(track_name, artist_name)
-            analysis = analyze_lyrics(lyrics, mood, activity, personal_status)
+            if i in llm_candidates:
+                analysis = analyze_lyrics(lyrics_list[i], mood, activity, personal_status, local_scores[i])
+            else:
+                analysis = local_analysis(local_scores[i], "Scored locally from lyric similarity")
 
             analyzed_tracks.append({
                 "track_name": track_name,
@@ -287,15 +608,24 @@ def analyze_songs():
                 "summary": analysis['summary'],
                 "mood_explanation": analysis['mood_explanation'],
                 "activity_explanation": analysis['activity_explanation'],
-                "personal_explanation": analysis['personal_explanation']
+                "personal_explanation": analysis['personal_explanation'],
+                "degraded": analysis.get('degraded', False)
             })
 
-        return jsonify(analyzed_tracks)
+        analysis_time = time.perf_counter() - start
+
+        response = jsonify(analyzed_tracks)
+        response.headers['Server-Timing'] = (
+            f'fetch;desc="{len(all_tracks)} candidates";dur={fetch_time * 1000:.1f}, '
+            f'prefilter;desc="{len(selected_tracks)} selected";dur={prefilter_time * 1000:.1f}, '
+            f'analysis;dur={analysis_time * 1000:.1f}'
+        )
+        if any(track['degraded'] for track in analyzed_tracks):
+            response.headers['X-Degraded'] = 'true'
+        return response
 
     except spotipy.SpotifyException as e:
         return jsonify({"error": f"Spotify API error: {str(e)}"}), 500
-    except openai.error.OpenAIError as e:
-        return jsonify({"error": f"OpenAI API error: {str(e)}"}), 500
     except KeyError as e:
         return jsonify({"error": f"Invalid input: missing key {str(e)}"}), 400
     except Exception as e:
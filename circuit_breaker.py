@@ -0,0 +1,104 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0,
+                 slow_call_threshold=10.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        # Calls slower than this count as failures even if they succeed
+        self.slow_call_threshold = slow_call_threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        # An open circuit moves to half-open once the recovery timeout has passed
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._probe_in_flight = False
+
+    def retry_after(self):
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+
+    def allow_request(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            # Half-open lets a single probe call through at a time
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self, elapsed=0.0):
+        if elapsed >= self.slow_call_threshold:
+            self.record_failure()
+            return
+        with self._lock:
+            state = self._current_state()
+            # Only a half-open probe closes the circuit; late successes from
+            # calls started before the trip leave an open circuit alone
+            if state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._failures = 0
+                self._probe_in_flight = False
+            elif state == self.CLOSED:
+                self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            if self._current_state() == self.HALF_OPEN:
+                self._trip()
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._trip()
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+        start = self._clock()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(self._clock() - start)
+        return result
@@ -0,0 +1,138 @@
+import json
+from collections import Counter
+import redis
+from cache import TTLCache
+
+
+class MemoryPlaylistStore:
+    def __init__(self, maxsize=1000, ttl=7 * 86400):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, playlist_id):
+        return self._cache.get(playlist_id)
+
+    def set(self, playlist_id, record):
+        self._cache.set(playlist_id, record)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisPlaylistStore:
+    def __init__(self, client, ttl=7 * 86400, prefix='floowy:playlist:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    # The store is only a cache: Redis errors count as a miss or a skipped write
+
+    def get(self, playlist_id):
+        try:
+            raw = self.client.get(self.prefix + playlist_id)
+        except redis.RedisError:
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, playlist_id, record):
+        try:
+            self.client.set(self.prefix + playlist_id, json.dumps(record), ex=int(self.ttl))
+        except redis.RedisError:
+            pass
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_playlist_store(redis_url=None, ttl=7 * 86400):
+    # Redis keeps snapshots across restarts and workers; memory is the fallback
+    if redis_url:
+        return RedisPlaylistStore(redis.Redis.from_url(redis_url), ttl=ttl)
+    return MemoryPlaylistStore(ttl=ttl)
+
+
+def playlist_track_key(track):
+    # Local files have no id, so fall back to the uri or the artist ids
+    return track.get('id') or track.get('uri') or '|'.join(artist.get('id') or '' for artist in track['artists'])
+
+
+def empty_playlist_record():
+    return {
+        "snapshot_id": None,
+        "total_tracks": 0,
+        "track_counts": {},
+        "track_artists": {},
+        "artist_counts": {},
+        "artist_genres": {},
+        "genre_counts": {}
+    }
+
+
+def update_playlist_record(record, snapshot_id, items, fetch_artist_genres):
+    # Applies only the added and removed tracks to a stored record.
+    # Genres count each distinct artist in the playlist once.
+    record = record or empty_playlist_record()
+
+    new_counts = Counter()
+    new_artists = {}
+    for item in items:
+        track = item['track']
+        if not track:
+            continue
+        key = playlist_track_key(track)
+        new_counts[key] += 1
+        new_artists[key] = [artist['id'] for artist in track['artists'] if artist.get('id')]
+
+    old_counts = Counter(record['track_counts'])
+    track_artists = dict(record['track_artists'])
+    added = new_counts - old_counts
+    removed = old_counts - new_counts
+
+    # Net change in track count per touched artist
+    artist_deltas = Counter()
+    for key, count in removed.items():
+        for artist_id in set(track_artists[key]):
+            artist_deltas[artist_id] -= count
+        if key not in new_counts:
+            del track_artists[key]
+    for key, count in added.items():
+        for artist_id in set(new_artists[key]):
+            artist_deltas[artist_id] += count
+        track_artists[key] = new_artists[key]
+
+    artist_counts = dict(record['artist_counts'])
+    arrived = []
+    gone = []
+    for artist_id, delta in artist_deltas.items():
+        before = artist_counts.get(artist_id, 0)
+        after = before + delta
+        if after > 0:
+            artist_counts[artist_id] = after
+        else:
+            artist_counts.pop(artist_id, None)
+        if before <= 0 < after:
+            arrived.append(artist_id)
+        elif after <= 0 < before:
+            gone.append(artist_id)
+
+    # Only artists new to the playlist need a genre lookup
+    artist_genres = dict(record['artist_genres'])
+    missing = [artist_id for artist_id in arrived if artist_id not in artist_genres]
+    if missing:
+        artist_genres.update(fetch_artist_genres(missing))
+
+    genre_counts = Counter(record['genre_counts'])
+    for artist_id in gone:
+        genre_counts.subtract(artist_genres.pop(artist_id, []))
+    for artist_id in arrived:
+        genre_counts.update(artist_genres.get(artist_id, []))
+
+    return {
+        "snapshot_id": snapshot_id,
+        "total_tracks": len(items),
+        "track_counts": dict(new_counts),
+        "track_artists": track_artists,
+        "artist_counts": artist_counts,
+        "artist_genres": artist_genres,
+        "genre_counts": {genre: count for genre, count in genre_counts.items() if count > 0}
+    }
@@ -0,0 +1,164 @@
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    # Periodically samples one thread's stack into folded "outer;...;inner" lines for flamegraphs
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+class EndpointProfile:
+    def __init__(self):
+        self.requests = 0
+        self.total_time = 0.0
+        self.stats = None
+        self.stacks = Counter()
+
+
+class RequestProfiler:
+    def __init__(self, mode='cprofile', sample_rate=0.0, interval=0.005):
+        if mode not in ('cprofile', 'sampling'):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.interval = interval
+        # Only one request is profiled at a time; cProfile cannot run twice at once
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def should_profile(self, forced=False):
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self):
+        if not self._active.acquire(blocking=False):
+            return None
+
+        session = {"start": time.perf_counter()}
+        if self.mode == 'cprofile':
+            session['profile'] = cProfile.Profile()
+            session['profile'].enable()
+        else:
+            session['sampler'] = StackSampler(threading.get_ident(), self.interval)
+            session['sampler'].start()
+        return session
+
+    def stop(self, session, endpoint):
+        try:
+            if 'profile' in session:
+                session['profile'].disable()
+            samples = session['sampler'].stop() if 'sampler' in session else None
+            elapsed = time.perf_counter() - session['start']
+        finally:
+            self._active.release()
+
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, EndpointProfile())
+            entry.requests += 1
+            entry.total_time += elapsed
+            if 'profile' in session:
+                if entry.stats is None:
+                    entry.stats = pstats.Stats(session['profile'])
+                else:
+                    entry.stats.add(session['profile'])
+            if samples:
+                entry.stacks.update(samples)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def hot_functions(self, entry, limit):
+        if entry.stats is not None:
+            rows = sorted(entry.stats.stats.items(), key=lambda x: x[1][2], reverse=True)[:limit]
+            return [{
+                "function": f"{func} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "total_time": round(total_time, 6),
+                "cumulative_time": round(cumulative_time, 6)
+            } for (filename, line, func), (_, calls, total_time, cumulative_time, _) in rows]
+
+        # Sampling mode: self samples from stack leaves, total samples from anywhere on the stack
+        self_samples = Counter()
+        total_samples = Counter()
+        for stack, count in entry.stacks.items():
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+        return [{
+            "function": frame,
+            "self_samples": count,
+            "total_samples": total_samples[frame]
+        } for frame, count in self_samples.most_common(limit)]
+
+    def report(self, endpoint=None, limit=20):
+        with self._lock:
+            report = {}
+            for name, entry in self._endpoints.items():
+                if endpoint and name != endpoint:
+                    continue
+                report[name] = {
+                    "mode": self.mode,
+                    "requests": entry.requests,
+                    "avg_time": round(entry.total_time / entry.requests, 6),
+                    "hot_functions": self.hot_functions(entry, limit)
+                }
+            return report
+
+    def folded_stacks(self, endpoint):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                return ''
+            return ''.join(f"{stack} {count}\n" for stack, count in entry.stacks.most_common())
+
+    def init_app(self, app, force=lambda: False):
+        # force is called per request and returns True to profile it regardless of sampling
+        @app.before_request
+        def start_profiling():
+            if not self.should_profile(force()):
+                return
+            session = self.start()
+            if session is not None:
+                g.profile_session = session
+
+        @app.teardown_request
+        def stop_profiling(exc):
+            session = g.pop('profile_session', None)
+            if session is not None:
+                self.stop(session, request.endpoint or 'unknown')
@@ -0,0 +1,53 @@
+import numpy as np
+
+DEFAULT_WEIGHTS = {
+    'popularity': 0.4,
+    'track_genres': 0.3,
+    'artist_genres': 0.3
+}
+
+
+def primary_artist_key(track):
+    artist = track['artists'][0]
+    return artist.get('id') or artist['name']
+
+
+def prefilter_tracks(tracks, track_genres, genres, top_k, max_per_artist=1, weights=None):
+    # Cheap first-stage ranking over the whole candidate pool.
+    # track_genres maps track id to the set of requested genres whose search returned it.
+    if not tracks:
+        return []
+
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    genre_count = max(len(genres), 1)
+    artist_keys = [primary_artist_key(track) for track in tracks]
+
+    # Requested genres each artist appeared under, across all of their tracks
+    artist_genres = {}
+    for track, key in zip(tracks, artist_keys):
+        artist_genres.setdefault(key, set()).update(track_genres.get(track['id'], ()))
+
+    popularity = np.array([track.get('popularity') or 0 for track in tracks], dtype=np.float64) / 100.0
+    track_coverage = np.array([len(track_genres.get(track['id'], ())) for track in tracks], dtype=np.float64) / genre_count
+    artist_coverage = np.array([len(artist_genres[key]) for key in artist_keys], dtype=np.float64) / genre_count
+
+    scores = (
+        weights['popularity'] * popularity
+        + weights['track_genres'] * track_coverage
+        + weights['artist_genres'] * artist_coverage
+    )
+    order = np.argsort(-scores, kind='stable')
+
+    # Walk the ranking and suppress extra tracks by the same artist
+    selected = []
+    per_artist = {}
+    for i in order.tolist():
+        key = artist_keys[i]
+        if per_artist.get(key, 0) >= max_per_artist:
+            continue
+        per_artist[key] = per_artist.get(key, 0) + 1
+        selected.append(tracks[i])
+        if len(selected) == top_k:
+            break
+
+    return selected
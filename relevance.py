@@ -0,0 +1,77 @@
+import re
+import zlib
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'i', 'in',
+    'is', 'it', 'me', 'my', 'of', 'on', 'or', 'so', 'that', 'the', 'this',
+    'to', 'was', 'we', 'while', 'with', 'you', 'your'
+])
+
+
+class HashingEmbedder:
+    # Offline bag-of-words embedding: hashed unigrams and bigrams, sublinear tf, L2-normalized
+    def __init__(self, n_features=4096, use_bigrams=True):
+        self.n_features = n_features
+        self.use_bigrams = use_bigrams
+
+    def tokens(self, text):
+        words = [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in STOP_WORDS]
+        if self.use_bigrams:
+            words += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return words
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            columns = [zlib.crc32(token.encode('utf-8')) % self.n_features for token in self.tokens(text or '')]
+            if columns:
+                np.add.at(matrix[row], columns, 1.0)
+
+        np.log1p(matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+default_embedder = HashingEmbedder()
+
+
+def relevance_scores(documents, contexts, embedder=default_embedder):
+    # Cosine similarity of every document against every context, mapped to 0-10
+    if not documents:
+        return np.zeros((0, len(contexts)), dtype=np.int64)
+
+    similarity = embedder.embed(documents) @ embedder.embed(contexts).T
+    # Hashed term overlap is sparse, so the square root spreads typical similarities across the scale
+    scores = np.rint(10 * np.sqrt(np.clip(similarity, 0.0, 1.0)))
+    return scores.astype(np.int64)
+
+
+def score_tracks(lyrics_list, mood, activity, personal_status, embedder=default_embedder):
+    # Columns are mood, activity and personal relevance
+    return relevance_scores(lyrics_list, [mood, activity, personal_status], embedder)
+
+
+def select_candidates(scores, top_k, margin=1.0):
+    # Always pick the top_k tracks by mood > personal > activity, keeping the incoming order
+    # on ties (so the prefilter order decides when there is no local signal). Up to top_k
+    # more within margin of the cutoff are added as uncertain, except tracks with no local
+    # signal (all-zero scores) or tied at the floor, which carry no ranking information.
+    if top_k <= 0 or len(scores) == 0:
+        return np.arange(0)
+    if len(scores) <= top_k:
+        return np.arange(len(scores))
+
+    priority = scores[:, 0] + scores[:, 2] / 10.0 + scores[:, 1] / 100.0
+    order = np.argsort(-priority, kind='stable')
+    cutoff = priority[order[top_k - 1]]
+    rest = order[top_k:]
+    uncertain = rest[
+        (priority[rest] >= cutoff - margin)
+        & scores[rest].any(axis=1)
+        & (priority[rest] > priority.min())
+    ][:top_k]
+    return np.sort(np.concatenate([order[:top_k], uncertain]))
@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class QuotaExceededError(Exception):
+    def __init__(self, credits_left, needed):
+        super().__init__(f"Not enough Suno credits: {credits_left} left, {needed} needed")
+        self.credits_left = credits_left
+        self.needed = needed
+
+
+class SchedulerBusyError(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaScheduler:
+    def __init__(self, fetch_quota, cost_per_generation=10, refresh_interval=60.0,
+                 max_concurrent=4, max_queue=16, queue_timeout=30.0,
+                 low_priority_reserve=0, clock=time.monotonic):
+        self.fetch_quota = fetch_quota
+        self.cost_per_generation = cost_per_generation
+        self.refresh_interval = refresh_interval
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Credits held back from low priority requests
+        self.low_priority_reserve = low_priority_reserve
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.reset()
+
+    def reset(self):
+        with self._cond:
+            self._quota = None
+            self._credits_left = None
+            self._fetched_at = None
+            self._refreshing = False
+            self._in_flight = 0
+            self._waiting = []
+            self._cond.notify_all()
+
+    def refresh(self):
+        try:
+            quota = self.fetch_quota()
+            credits_left = int(quota['credits_left'])
+        except Exception:
+            # Keep the last known quota; admission falls back to concurrency limits only
+            quota = None
+        with self._cond:
+            if quota is not None:
+                self._quota = quota
+                self._credits_left = credits_left
+            self._fetched_at = self._clock()
+            self._refreshing = False
+            self._cond.notify_all()
+
+    def _refresh_if_stale(self):
+        with self._cond:
+            stale = self._fetched_at is None or self._clock() - self._fetched_at >= self.refresh_interval
+            if not stale or self._refreshing:
+                return
+            self._refreshing = True
+            first_fetch = self._fetched_at is None
+
+        if first_fetch:
+            self.refresh()
+        else:
+            # Serve the cached quota while a background refresh runs
+            threading.Thread(target=self.refresh, daemon=True).start()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "credits_left": self._credits_left,
+                "available_credits": self._available_credits(),
+                "in_flight": self._in_flight,
+                "queued": len(self._waiting),
+                "quota_age": None if self._fetched_at is None else round(self._clock() - self._fetched_at, 1)
+            }
+
+    def _available_credits(self):
+        if self._credits_left is None:
+            return None
+        return self._credits_left - self._in_flight * self.cost_per_generation
+
+    def _check_credits(self, priority):
+        available = self._available_credits()
+        if available is None:
+            return
+        needed = self.cost_per_generation
+        if priority == 'low':
+            needed += self.low_priority_reserve
+        if available < needed:
+            raise QuotaExceededError(max(available, 0), needed)
+
+    def acquire(self, priority='normal'):
+        rank = PRIORITIES[priority]
+        self._refresh_if_stale()
+
+        with self._cond:
+            self._check_credits(priority)
+            if self._in_flight < self.max_concurrent and not self._waiting:
+                self._in_flight += 1
+                return
+
+            if len(self._waiting) >= self.max_queue:
+                raise SchedulerBusyError("Song generation queue is full", self.queue_timeout)
+
+            # Wait in priority order for a free slot
+            entry = (rank, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            deadline = self._clock() + self.queue_timeout
+            try:
+                while self._waiting[0] != entry or self._in_flight >= self.max_concurrent:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        raise SchedulerBusyError("Timed out waiting for a song generation slot", self.queue_timeout)
+                    self._cond.wait(remaining)
+                heapq.heappop(self._waiting)
+                self._check_credits(priority)
+                self._in_flight += 1
+            except Exception:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                raise
+            finally:
+                self._cond.notify_all()
+
+    def release(self, spent=True):
+        with self._cond:
+            self._in_flight -= 1
+            # Track spending locally until the next quota refresh
+            if spent and self._credits_left is not None:
+                self._credits_left = max(0, self._credits_left - self.cost_per_generation)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority='normal'):
+        self.acquire(priority)
+        try:
+            yield
+        except Exception:
+            self.release(spent=False)
+            raise
+        self.release(spent=True)
@@ -2,7 +2,8 @@ import os
 import unittest
 import json
 from unittest.mock import MagicMock, patch
-from app import app
+from app import app, analysis_cache, generation_requests, generation_scheduler, openai_breaker, playlist_store, profiler, song_cache, suno_breaker, suno_quota_breaker
+import openai
 import requests
 import spotipy
 from dotenv import load_dotenv
@@ -14,6 +15,20 @@ class TestMusicRecommendationAPI(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
         self.app.testing = True
+        suno_breaker.reset()
+        openai_breaker.reset()
+        suno_quota_breaker.reset()
+        analysis_cache.clear()
+        song_cache.clear()
+        generation_requests.clear()
+        generation_scheduler.reset()
+        playlist_store.clear()
+        profiler.reset()
+
+        # Plenty of Suno credits unless a test says otherwise
+        self.quota_patcher = patch('app.get_quota_information', return_value={'credits_left': 1000})
+        self.mock_quota = self.quota_patcher.start()
+        self.addCleanup(self.quota_patcher.stop)
 
     def test_recommend_songs(self):
         # Test data
@@ -86,6 +101,39 @@ class TestMusicRecommendationAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn("Invalid input: missing required fields", json.loads(response.data)["error"])
 
+    @patch('app.ADMIN_TOKEN', 'secret')
+    def test_profile_requests(self):
+        test_songs = [
+            {"song_name": "Happy", "mood_relevance_score": 8, "activity_relevance_score": 6, "personal_relevance_score": 7}
+        ]
+
+        # Not profiled without the header
+        self.app.post('/api/recommend', data=json.dumps(test_songs), content_type='application/json')
+        # The header is ignored without the admin token
+        self.app.post('/api/recommend', data=json.dumps(test_songs), content_type='application/json',
+                      headers={'X-Profile': '1'})
+        response = self.app.get('/api/admin/profiles', headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(json.loads(response.data), {})
+
+        response = self.app.post('/api/recommend', data=json.dumps(test_songs), content_type='application/json',
+                                 headers={'X-Profile': '1', 'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.app.get('/api/admin/profiles?limit=50', headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        profile = json.loads(response.data)['recommend_songs']
+        self.assertEqual(profile['requests'], 1)
+        self.assertTrue(any('recommend_songs' in row['function'] for row in profile['hot_functions']))
+
+        # Profiles can be cleared
+        self.app.delete('/api/admin/profiles', headers={'X-Admin-Token': 'secret'})
+        response = self.app.get('/api/admin/profiles', headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(json.loads(response.data), {})
+
+    def test_profiles_require_admin(self):
+        response = self.app.get('/api/admin/profiles')
+        self.assertEqual(response.status_code, 403)
+
     @patch('app.custom_generate_audio')
     def test_generate_song(self, mock_generate_audio):
         # Mock the API response
@@ -126,6 +174,170 @@ class TestMusicRecommendationAPI(unittest.TestCase):
         self.assertEqual(response_data['id_1'], '351cfc17-7fa9-4a89-b133-750b4e67e885')
         self.assertEqual(response_data['audio_url_1'], 'https://audiopipe.suno.ai/?item_id=351cfc17-7fa9-4a89-b133-750b4e67e885')
 
+    @patch('app.custom_generate_audio')
+    def test_generate_song_cached(self, mock_generate_audio):
+        mock_generate_audio.return_value = [{
+            "0": {"id": "clip-0", "audio_url": "https://audiopipe.suno.ai/?item_id=clip-0"},
+            "1": {"id": "clip-1", "audio_url": "https://audiopipe.suno.ai/?item_id=clip-1"}
+        }]
+
+        first = self.app.post('/api/generate-song',
+                              data=json.dumps({"mood": "happy", "activity": "running", "personal_details": "Feeling great"}),
+                              content_type='application/json')
+        # Same prompt after case and whitespace normalization
+        second = self.app.post('/api/generate-song',
+                               data=json.dumps({"mood": "Happy", "activity": " running", "personal_details": "feeling  great"}),
+                               content_type='application/json')
+
+        # Check that Suno was only called once
+        self.assertEqual(mock_generate_audio.call_count, 1)
+        self.assertEqual(first.headers['X-Cache'], 'MISS')
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(json.loads(first.data), json.loads(second.data))
+
+    @patch('app.custom_generate_audio')
+    def test_generate_song_failure_not_cached(self, mock_generate_audio):
+        mock_generate_audio.return_value = []
+        test_data = {"mood": "sad", "activity": "walking", "personal_details": ""}
+
+        for _ in range(2):
+            response = self.app.post('/api/generate-song',
+                                     data=json.dumps(test_data),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 500)
+
+        self.assertEqual(mock_generate_audio.call_count, 2)
+
+    @patch('app.ADMIN_TOKEN', 'secret')
+    @patch('app.custom_generate_audio')
+    def test_prewarm_songs(self, mock_generate_audio):
+        mock_generate_audio.return_value = [{
+            "0": {"id": "clip-0", "audio_url": "https://audiopipe.suno.ai/?item_id=clip-0"},
+            "1": {"id": "clip-1", "audio_url": "https://audiopipe.suno.ai/?item_id=clip-1"}
+        }]
+        generation_requests[('happy', 'running')] = 3
+
+        # Requires the admin token
+        response = self.app.post('/api/prewarm-songs')
+        self.assertEqual(response.status_code, 403)
+
+        response = self.app.post('/api/prewarm-songs', headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['warmed'],
+                         [{"mood": "happy", "activity": "running", "status": "generated"}])
+
+        # A matching request is now served from the pre-warmed cache
+        response = self.app.post('/api/generate-song',
+                                 data=json.dumps({"mood": "happy", "activity": "running", "personal_details": ""}),
+                                 content_type='application/json')
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(mock_generate_audio.call_count, 1)
+
+    @patch('app.custom_generate_audio')
+    def test_generate_song_quota_exhausted(self, mock_generate_audio):
+        self.mock_quota.return_value = {'credits_left': 5}
+
+        response = self.app.post('/api/generate-song',
+                                 data=json.dumps({"mood": "happy", "activity": "running", "personal_details": ""}),
+                                 content_type='application/json')
+
+        # Check that the request is rejected without calling Suno
+        self.assertEqual(response.status_code, 429)
+        response_data = json.loads(response.data)
+        self.assertEqual(response_data['status'], 'quota_exhausted')
+        self.assertEqual(response_data['credits_left'], 5)
+        mock_generate_audio.assert_not_called()
+
+    @patch('app.custom_generate_audio')
+    def test_generation_status(self, mock_generate_audio):
+        mock_generate_audio.return_value = [{
+            "0": {"id": "clip-0", "audio_url": "https://audiopipe.suno.ai/?item_id=clip-0"},
+            "1": {"id": "clip-1", "audio_url": "https://audiopipe.suno.ai/?item_id=clip-1"}
+        }]
+        self.app.post('/api/generate-song',
+                      data=json.dumps({"mood": "happy", "activity": "running", "personal_details": "", "priority": "high"}),
+                      content_type='application/json')
+
+        response = self.app.get('/api/generation-status')
+
+        # Spent credits are tracked locally until the next quota refresh
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.data)
+        self.assertNotIn('quota', response_data)
+        self.assertEqual(response_data['credits_left'], 990)
+        self.assertEqual(response_data['in_flight'], 0)
+        self.assertEqual(response_data['queued'], 0)
+        self.assertEqual(self.mock_quota.call_count, 1)
+
+    @patch('app.requests.get')
+    def test_quota_fetch_does_not_touch_generation_breaker(self, mock_get):
+        # Use the real quota lookup instead of the setUp patch
+        self.quota_patcher.stop()
+        from app import get_quota_information
+        mock_get.return_value = MagicMock(json=MagicMock(return_value={'credits_left': 50}))
+
+        for _ in range(suno_breaker.failure_threshold):
+            suno_breaker.record_failure()
+        self.assertEqual(get_quota_information(), {'credits_left': 50})
+
+        self.assertEqual(suno_breaker.state, 'open')
+
+    def test_generate_song_invalid_priority(self):
+        response = self.app.post('/api/generate-song',
+                                 data=json.dumps({"mood": "happy", "activity": "running", "personal_details": "", "priority": "urgent"}),
+                                 content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("priority must be one of", json.loads(response.data)["error"])
+
+    @patch('app.ADMIN_TOKEN', 'secret')
+    @patch('app.custom_generate_audio')
+    def test_prewarm_songs_records_errors_per_pair(self, mock_generate_audio):
+        mock_generate_audio.side_effect = [
+            requests.RequestException("Suno down"),
+            [{"0": {"id": "clip-0", "audio_url": "url-0"}, "1": {"id": "clip-1", "audio_url": "url-1"}}]
+        ]
+        pairs = [{"mood": "sad", "activity": "walking"}, {"mood": "happy", "activity": "running"}]
+
+        response = self.app.post('/api/prewarm-songs', headers={'X-Admin-Token': 'secret'},
+                                 data=json.dumps({"pairs": pairs}), content_type='application/json')
+
+        # One failing pair does not abort the others
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([pair['status'] for pair in json.loads(response.data)['warmed']], ['failed', 'generated'])
+
+    @patch('app.ADMIN_TOKEN', 'secret')
+    @patch('app.custom_generate_audio')
+    def test_prewarm_songs_unexpected_error_per_pair(self, mock_generate_audio):
+        mock_generate_audio.side_effect = [
+            ValueError("bad JSON from Suno"),
+            [{"0": {"id": "clip-0", "audio_url": "url-0"}, "1": {"id": "clip-1", "audio_url": "url-1"}}]
+        ]
+        pairs = [{"mood": "sad", "activity": "walking"}, {"mood": "happy", "activity": "running"}]
+
+        response = self.app.post('/api/prewarm-songs', headers={'X-Admin-Token': 'secret'},
+                                 data=json.dumps({"pairs": pairs}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([pair['status'] for pair in json.loads(response.data)['warmed']], ['failed', 'generated'])
+
+    @patch('app.ADMIN_TOKEN', 'secret')
+    def test_prewarm_songs_invalid_pairs(self):
+        for pairs in ["happy", ["happy"], [{"mood": "happy"}], {"mood": "happy", "activity": "running"}]:
+            response = self.app.post('/api/prewarm-songs', headers={'X-Admin-Token': 'secret'},
+                                     data=json.dumps({"pairs": pairs}), content_type='application/json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("pairs must be a list", json.loads(response.data)["error"])
+
+    @patch('app.ADMIN_TOKEN', 'secret')
+    def test_prewarm_songs_invalid_limit(self):
+        response = self.app.post('/api/prewarm-songs', headers={'X-Admin-Token': 'secret'},
+                                 data=json.dumps({"limit": "5"}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("limit must be a non-negative integer", json.loads(response.data)["error"])
+
     def test_generate_song_missing_fields(self):
         # Test with missing fields
         invalid_data = {"mood": "happy"}
@@ -200,6 +412,64 @@ class TestMusicRecommendationAPI(unittest.TestCase):
         # Check if the number of genres is at most 10
         self.assertLessEqual(len(response_data['genres']), 10)
 
+    @patch('app.spotify')
+    def test_playlist_genres_snapshot(self, mock_spotify):
+        mock_spotify.playlist.return_value = {'snapshot_id': 'snap1'}
+        mock_spotify.playlist_tracks.return_value = {
+            'items': [
+                {'track': {'id': 'track1', 'artists': [{'id': 'artist1'}]}},
+                {'track': {'id': 'track2', 'artists': [{'id': 'artist2'}]}},
+            ],
+            'next': None
+        }
+        mock_spotify.artists.return_value = {
+            'artists': [
+                {'id': 'artist1', 'genres': ['pop', 'rock']},
+                {'id': 'artist2', 'genres': ['rock']},
+            ]
+        }
+        test_data = {
+            "playlist_url": "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+        }
+
+        response = self.app.post('/api/playlist-genres',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.data)['genres'], {'rock': 2, 'pop': 1})
+
+        # Unchanged snapshot is served without listing tracks again
+        mock_spotify.playlist_tracks.reset_mock()
+        response = self.app.post('/api/playlist-genres',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(json.loads(response.data)['genres'], {'rock': 2, 'pop': 1})
+        mock_spotify.playlist_tracks.assert_not_called()
+
+        # Changed snapshot: track2 removed, track3 added
+        mock_spotify.playlist.return_value = {'snapshot_id': 'snap2'}
+        mock_spotify.playlist_tracks.return_value = {
+            'items': [
+                {'track': {'id': 'track1', 'artists': [{'id': 'artist1'}]}},
+                {'track': {'id': 'track3', 'artists': [{'id': 'artist3'}]}},
+            ],
+            'next': None
+        }
+        mock_spotify.artists.reset_mock()
+        mock_spotify.artists.return_value = {'artists': [{'id': 'artist3', 'genres': ['jazz']}]}
+
+        response = self.app.post('/api/playlist-genres',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+
+        # Only the new artist is resolved
+        self.assertEqual(response.headers['X-Cache'], 'INCREMENTAL')
+        mock_spotify.artists.assert_called_once_with(['artist3'])
+        response_data = json.loads(response.data)
+        self.assertEqual(response_data['genres'], {'pop': 1, 'rock': 1, 'jazz': 1})
+        self.assertEqual(response_data['total_tracks'], 2)
+
     def test_playlist_genres_missing_url(self):
         # Test with missing playlist URL
         invalid_data = {}
@@ -269,7 +539,7 @@ class TestMusicRecommendationAPI(unittest.TestCase):
 
     @patch('app.spotify')
     @patch('app.get_song_lyrics')
-    @patch('app.openai.ChatCompletion.create')
+    @patch('app.client.chat.completions.create')
     def test_analyze_songs(self, mock_openai, mock_get_lyrics, mock_spotify):
         # Mock Spotify API response
         mock_spotify.search.return_value = {
@@ -296,7 +566,7 @@ class TestMusicRecommendationAPI(unittest.TestCase):
 
         # Mock OpenAI API response
         mock_openai.return_value = MagicMock(
-            choices=[MagicMock(message={'content': json.dumps({
+            choices=[MagicMock(message=MagicMock(content=json.dumps({
                 'mood_relevance_score': 8,
                 'activity_relevance_score': 7,
                 'personal_relevance_score': 6,
@@ -304,7 +574,7 @@ class TestMusicRecommendationAPI(unittest.TestCase):
                 'mood_explanation': 'This is a mock mood explanation.',
                 'activity_explanation': 'This is a mock activity explanation.',
                 'personal_explanation': 'This is a mock personal explanation.'
-            })})]
+            })))]
         )
 
         # Test data
@@ -323,6 +593,9 @@ class TestMusicRecommendationAPI(unittest.TestCase):
         # Check if the response status code is 200 (OK)
         self.assertEqual(response.status_code, 200)
 
+        # Check that the LLM analyzed the tracks even though placeholder lyrics have no local signal
+        self.assertGreater(mock_openai.call_count, 0)
+
         # Check if the response data contains the expected information
         response_data = json.loads(response.data)
         self.assertEqual(len(response_data), 2)  # We expect 2 tracks in this test case
@@ -383,6 +656,320 @@ class TestMusicRecommendationAPI(unittest.TestCase):
         # Check if the response status code is 500 (Internal Server Error)
         self.assertEqual(response.status_code, 500)
         self.assertIn("Spotify API error", json.loads(response.data)["error"])
+
+    @patch('app.requests.post')
+    def test_generate_song_circuit_open(self, mock_post):
+        # Trip the Suno circuit
+        for _ in range(suno_breaker.failure_threshold):
+            suno_breaker.record_failure()
+
+        test_data = {
+            "mood": "happy",
+            "activity": "running",
+            "personal_details": "Feeling energetic"
+        }
+
+        response = self.app.post('/api/generate-song',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+
+        # Check that the request is rejected without calling Suno
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertIn("temporarily unavailable", json.loads(response.data)["error"])
+        mock_post.assert_not_called()
+
+    @patch('app.spotify')
+    @patch('app.get_song_lyrics')
+    @patch('app.client.chat.completions.create')
+    def test_analyze_songs_degraded(self, mock_openai, mock_get_lyrics, mock_spotify):
+        mock_spotify.search.return_value = {
+            'tracks': {
+                'items': [
+                    {
+                        'id': 'track1',
+                        'name': 'Song 1',
+                        'artists': [{'name': 'Artist 1'}],
+                        'external_urls': {'spotify': 'https://open.spotify.com/track/1'}
+                    }
+                ]
+            }
+        }
+        # Lyrics that match the context locally, so the track is sent to the LLM
+        mock_get_lyrics.return_value = "Happy running, feeling motivated"
+        mock_openai.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content=json.dumps({
+                'mood_relevance_score': 9,
+                'activity_relevance_score': 8,
+                'personal_relevance_score': 7,
+                'summary': 'Cached summary.',
+                'mood_explanation': 'Cached mood explanation.',
+                'activity_explanation': 'Cached activity explanation.',
+                'personal_explanation': 'Cached personal explanation.'
+            })))]
+        )
+        test_data = {
+            "genres": ["pop"],
+            "mood": "happy",
+            "activity": "running",
+            "personal_status": "feeling motivated"
+        }
+
+        # First request populates the analysis cache
+        response = self.app.post('/api/analyze-songs',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(json.loads(response.data)[0]['degraded'])
+
+        # Trip the OpenAI circuit
+        for _ in range(openai_breaker.failure_threshold):
+            openai_breaker.record_failure()
+        mock_openai.reset_mock()
+
+        # Cached analysis is served without calling OpenAI
+        response = self.app.post('/api/analyze-songs',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get('X-Degraded'), 'true')
+        track = json.loads(response.data)[0]
+        self.assertTrue(track['degraded'])
+        self.assertEqual(track['mood_relevance_score'], 9)
+        self.assertEqual(track['summary'], 'Cached summary.')
+        mock_openai.assert_not_called()
+
+        # Without a cached analysis, heuristic scores are returned
+        test_data['mood'] = "calm"
+        response = self.app.post('/api/analyze-songs',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        track = json.loads(response.data)[0]
+        self.assertTrue(track['degraded'])
+        self.assertTrue(0 <= track['mood_relevance_score'] <= 10)
+
+    @patch('app.spotify')
+    @patch('app.get_song_lyrics')
+    @patch('app.client.chat.completions.create')
+    def test_analyze_songs_openai_error_degrades(self, mock_openai, mock_get_lyrics, mock_spotify):
+        mock_spotify.search.return_value = {
+            'tracks': {
+                'items': [
+                    {
+                        'id': 'track1',
+                        'name': 'Song 1',
+                        'artists': [{'name': 'Artist 1'}],
+                        'external_urls': {'spotify': 'https://open.spotify.com/track/1'}
+                    }
+                ]
+            }
+        }
+        # Lyrics that match the context locally, so the track is sent to the LLM
+        mock_get_lyrics.return_value = "Happy running, feeling motivated"
+        mock_openai.side_effect = openai.APITimeoutError(request=MagicMock())
+        test_data = {
+            "genres": ["pop"],
+            "mood": "happy",
+            "activity": "running",
+            "personal_status": "feeling motivated"
+        }
+
+        # Upstream errors degrade the response before the circuit has opened
+        response = self.app.post('/api/analyze-songs',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get('X-Degraded'), 'true')
+        self.assertTrue(json.loads(response.data)[0]['degraded'])
+        self.assertEqual(openai_breaker.state, 'closed')
+
+    @patch('app.spotify')
+    @patch('app.client.chat.completions.create')
+    def test_analyze_songs_degraded_reuses_local_scores(self, mock_openai, mock_spotify):
+        from relevance import score_tracks
+        mock_spotify.search.return_value = {
+            'tracks': {
+                'items': [
+                    {
+                        'id': f'track{i}',
+                        'name': f'Song {i}',
+                        'artists': [{'name': f'Artist {i}'}],
+                        'external_urls': {'spotify': f'https://open.spotify.com/track/{i}'}
+                    }
+                    for i in range(3)
+                ]
+            }
+        }
+        for _ in range(openai_breaker.failure_threshold):
+            openai_breaker.record_failure()
+        test_data = {
+            "genres": ["pop"],
+            "mood": "happy",
+            "activity": "running",
+            "personal_status": "feeling motivated"
+        }
+
+        with patch('app.score_tracks', wraps=score_tracks) as mock_score_tracks:
+            response = self.app.post('/api/analyze-songs',
+                                     data=json.dumps(test_data),
+                                     content_type='application/json')
+
+        # Heuristic fallbacks reuse the scores computed for the whole batch
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(track['degraded'] for track in json.loads(response.data)))
+        self.assertEqual(mock_score_tracks.call_count, 1)
+        mock_openai.assert_not_called()
+
+    def test_openai_client_does_not_retry(self):
+        from app import client
+        self.assertEqual(client.max_retries, 0)
+
+    @patch('app.spotify')
+    @patch('app.get_song_lyrics')
+    @patch('app.client.chat.completions.create')
+    def test_analyze_songs_bug_is_not_degraded(self, mock_openai, mock_get_lyrics, mock_spotify):
+        mock_spotify.search.return_value = {
+            'tracks': {
+                'items': [
+                    {
+                        'id': 'track1',
+                        'name': 'Song 1',
+                        'artists': [{'name': 'Artist 1'}],
+                        'external_urls': {'spotify': 'https://open.spotify.com/track/1'}
+                    }
+                ]
+            }
+        }
+        mock_get_lyrics.return_value = "Mock lyrics"
+        mock_openai.side_effect = TypeError("bad request building")
+        test_data = {
+            "genres": ["pop"],
+            "mood": "happy",
+            "activity": "running",
+            "personal_status": "feeling motivated"
+        }
+
+        response = self.app.post('/api/analyze-songs',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+
+        # Programming errors surface instead of being hidden as degraded answers
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("unexpected error", json.loads(response.data)["error"])
+
+    @patch('app.LLM_TOP_K', 1)
+    @patch('app.LOCAL_SCORE_MARGIN', 0)
+    @patch('app.spotify')
+    @patch('app.client.chat.completions.create')
+    def test_analyze_songs_local_prefilter(self, mock_openai, mock_spotify):
+        mock_spotify.search.return_value = {
+            'tracks': {
+                'items': [
+                    {
+                        'id': f'track{i}',
+                        'name': name,
+                        'artists': [{'name': f'Artist {i}'}],
+                        'external_urls': {'spotify': f'https://open.spotify.com/track/{i}'}
+                    }
+                    for i, name in enumerate(['Running Happy', 'Quiet Night', 'Slow Rain'])
+                ]
+            }
+        }
+        mock_openai.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content=json.dumps({
+                'mood_relevance_score': 10,
+                'activity_relevance_score': 10,
+                'personal_relevance_score': 10,
+                'summary': 'LLM summary.',
+                'mood_explanation': 'LLM mood explanation.',
+                'activity_explanation': 'LLM activity explanation.',
+                'personal_explanation': 'LLM personal explanation.'
+            })))]
+        )
+        test_data = {
+            "genres": ["pop"],
+            "mood": "happy",
+            "activity": "running",
+            "personal_status": "feeling motivated"
+        }
+
+        response = self.app.post('/api/analyze-songs',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+
+        # Only the best local match goes to the LLM
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_openai.call_count, 1)
+        response_data = {track['track_name']: track for track in json.loads(response.data)}
+        self.assertEqual(len(response_data), 3)
+        self.assertEqual(response_data['Running Happy']['summary'], 'LLM summary.')
+        for name in ['Quiet Night', 'Slow Rain']:
+            self.assertIn('locally', response_data[name]['summary'])
+            self.assertIsInstance(response_data[name]['mood_relevance_score'], int)
+            self.assertFalse(response_data[name]['degraded'])
+
+    @patch('app.PREFILTER_TOP_K', 2)
+    @patch('app.spotify')
+    @patch('app.get_song_lyrics')
+    @patch('app.analyze_lyrics')
+    def test_analyze_songs_two_stage(self, mock_analyze, mock_get_lyrics, mock_spotify):
+        def page(offset, ids):
+            return {
+                'tracks': {
+                    'items': [
+                        {
+                            'id': track_id,
+                            'name': track_id,
+                            'popularity': popularity,
+                            'artists': [{'id': artist, 'name': artist}],
+                            'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'}
+                        }
+                        for track_id, artist, popularity in ids
+                    ],
+                    'next': 'more' if offset == 0 else None
+                }
+            }
+
+        def search(q, type, limit, offset):
+            if offset == 0:
+                return page(offset, [('a', 'artist1', 90), ('b', 'artist1', 80)])
+            return page(offset, [('c', 'artist2', 10), ('d', 'artist3', 50)])
+
+        mock_spotify.search.side_effect = search
+        mock_get_lyrics.return_value = "Mock lyrics"
+        mock_analyze.return_value = {
+            'mood_relevance_score': 5,
+            'activity_relevance_score': 5,
+            'personal_relevance_score': 5,
+            'summary': 'Summary.',
+            'mood_explanation': 'Mood.',
+            'activity_explanation': 'Activity.',
+            'personal_explanation': 'Personal.'
+        }
+        test_data = {
+            "genres": ["pop"],
+            "mood": "happy",
+            "activity": "running",
+            "personal_status": "feeling motivated"
+        }
+
+        response = self.app.post('/api/analyze-songs',
+                                 data=json.dumps(test_data),
+                                 content_type='application/json')
+
+        # Both pages are fetched, then the prefilter keeps the top 2 distinct artists
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_spotify.search.call_count, 2)
+        self.assertEqual([track['track_name'] for track in json.loads(response.data)], ['a', 'd'])
+
+        # Per-stage timings are reported
+        server_timing = response.headers['Server-Timing']
+        for stage in ['fetch', 'prefilter', 'analysis']:
+            self.assertIn(f'{stage};', server_timing)
+        self.assertIn('4 candidates', server_timing)
+
     @unittest.skip("Only needed when debugging")
     def test_analyze_songs_real(self):
         # Test data
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from cache import SingleFlight, TTLCache
+from helpers import FakeClock
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_expires_entries(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+        cache.set('a', 1)
+
+        clock.now = 59
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 61
+        self.assertIsNone(cache.get('a'))
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'song'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+        follower.start()
+        # Give the follower time to join the in-flight call
+        time.sleep(0.1)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(results, ['song', 'song'])
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_are_not_remembered(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
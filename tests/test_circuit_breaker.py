@@ -0,0 +1,76 @@
+import unittest
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from helpers import FakeClock
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=30,
+                                      slow_call_threshold=5, clock=self.clock)
+
+    def fail(self):
+        raise ValueError("upstream down")
+
+    def test_opens_after_failure_threshold(self):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.breaker.call(self.fail)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        # Open circuit rejects calls without invoking the function
+        with self.assertRaises(CircuitOpenError) as ctx:
+            self.breaker.call(self.fail)
+        self.assertEqual(ctx.exception.retry_after, 30)
+
+    def test_slow_calls_trip_the_circuit(self):
+        def slow():
+            self.clock.now += 6
+            return 'ok'
+
+        self.assertEqual(self.breaker.call(slow), 'ok')
+        self.assertEqual(self.breaker.call(slow), 'ok')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+        # Only one probe is allowed while half-open
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        # A successful probe closes the circuit
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_late_success_does_not_close_open_circuit(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        # A call that started before the trip finishes successfully
+        self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_success_resets_failures_when_closed(self):
+        self.breaker.record_failure()
+        self.breaker.record_success(0.1)
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 30
+
+        with self.assertRaises(ValueError):
+            self.breaker.call(self.fail)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import MagicMock
+import redis
+from playlist_store import MemoryPlaylistStore, RedisPlaylistStore, update_playlist_record
+
+
+def item(track_id, *artist_ids):
+    return {'track': {'id': track_id, 'artists': [{'id': artist_id} for artist_id in artist_ids]}}
+
+
+class TestPlaylistRecord(unittest.TestCase):
+    def setUp(self):
+        self.genres = {
+            'a1': ['pop', 'rock'],
+            'a2': ['rock'],
+            'a3': ['jazz'],
+        }
+        self.lookups = []
+
+    def fetch_artist_genres(self, artist_ids):
+        self.lookups.append(list(artist_ids))
+        return {artist_id: self.genres[artist_id] for artist_id in artist_ids}
+
+    def test_full_build_counts_each_artist_once(self):
+        record = update_playlist_record(None, 's1', [item('t1', 'a1'), item('t2', 'a1', 'a2')], self.fetch_artist_genres)
+
+        self.assertEqual(record['genre_counts'], {'pop': 1, 'rock': 2})
+        self.assertEqual(record['total_tracks'], 2)
+        self.assertEqual(sorted(self.lookups[0]), ['a1', 'a2'])
+
+    def test_incremental_update(self):
+        record = update_playlist_record(None, 's1', [item('t1', 'a1'), item('t2', 'a2')], self.fetch_artist_genres)
+        self.lookups.clear()
+
+        # t2 removed (a2 leaves the playlist), t3 added with an artist already present and a new one
+        record = update_playlist_record(record, 's2', [item('t1', 'a1'), item('t3', 'a1', 'a3')], self.fetch_artist_genres)
+
+        self.assertEqual(record['snapshot_id'], 's2')
+        self.assertEqual(record['genre_counts'], {'pop': 1, 'rock': 1, 'jazz': 1})
+        self.assertEqual(record['artist_counts'], {'a1': 2, 'a3': 1})
+        self.assertNotIn('a2', record['artist_genres'])
+        self.assertEqual(self.lookups, [['a3']])
+
+    def test_duplicate_tracks(self):
+        record = update_playlist_record(None, 's1', [item('t1', 'a1'), item('t1', 'a1')], self.fetch_artist_genres)
+        # Removing one copy keeps the artist in the playlist
+        record = update_playlist_record(record, 's2', [item('t1', 'a1')], self.fetch_artist_genres)
+
+        self.assertEqual(record['genre_counts'], {'pop': 1, 'rock': 1})
+        self.assertEqual(record['artist_counts'], {'a1': 1})
+
+    def test_removing_everything(self):
+        record = update_playlist_record(None, 's1', [item('t1', 'a1')], self.fetch_artist_genres)
+        record = update_playlist_record(record, 's2', [], self.fetch_artist_genres)
+
+        self.assertEqual(record['genre_counts'], {})
+        self.assertEqual(record['track_artists'], {})
+
+
+class TestMemoryPlaylistStore(unittest.TestCase):
+    def test_get_set(self):
+        store = MemoryPlaylistStore()
+        self.assertIsNone(store.get('p1'))
+        store.set('p1', {'snapshot_id': 's1'})
+        self.assertEqual(store.get('p1'), {'snapshot_id': 's1'})
+
+
+
+class TestRedisPlaylistStore(unittest.TestCase):
+    def test_round_trip(self):
+        client = MagicMock()
+        store = RedisPlaylistStore(client, ttl=60)
+        store.set('p1', {'snapshot_id': 's1'})
+
+        key, raw = client.set.call_args[0]
+        self.assertEqual(key, 'floowy:playlist:p1')
+        client.get.return_value = raw
+        self.assertEqual(store.get('p1'), {'snapshot_id': 's1'})
+
+    def test_redis_errors_fall_back(self):
+        client = MagicMock()
+        client.get.side_effect = redis.ConnectionError("down")
+        client.set.side_effect = redis.ConnectionError("down")
+        store = RedisPlaylistStore(client)
+
+        # A failed read is a miss and a failed write is skipped
+        self.assertIsNone(store.get('p1'))
+        store.set('p1', {'snapshot_id': 's1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import time
+import unittest
+from flask import Flask
+from profiling import RequestProfiler
+
+
+def busy_work():
+    deadline = time.perf_counter() + 0.05
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def make_app(profiler):
+    app = Flask(__name__)
+    profiler.init_app(app, force=lambda: True)
+
+    @app.route('/work')
+    def work():
+        busy_work()
+        return 'ok'
+
+    return app
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def test_cprofile_mode(self):
+        profiler = RequestProfiler(mode='cprofile')
+        client = make_app(profiler).test_client()
+        client.get('/work')
+        client.get('/work')
+
+        report = profiler.report()
+        self.assertEqual(report['work']['requests'], 2)
+        functions = [row['function'] for row in report['work']['hot_functions']]
+        self.assertTrue(any('busy_work' in function for function in functions))
+
+    def test_sampling_mode(self):
+        profiler = RequestProfiler(mode='sampling', interval=0.001)
+        client = make_app(profiler).test_client()
+        client.get('/work')
+
+        folded = profiler.folded_stacks('work')
+        self.assertIn('busy_work', folded)
+        # Each line is "frame;frame;... count"
+        stack, count = folded.splitlines()[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(profiler.report('work')['work']['hot_functions'])
+
+    def test_disabled_by_default(self):
+        profiler = RequestProfiler()
+        app = Flask(__name__)
+        profiler.init_app(app)
+
+        @app.route('/work')
+        def work():
+            return 'ok'
+
+        app.test_client().get('/work')
+        self.assertEqual(profiler.report(), {})
+
+    def test_sample_rate(self):
+        self.assertFalse(RequestProfiler(sample_rate=0).should_profile())
+        self.assertTrue(RequestProfiler(sample_rate=1).should_profile())
+        self.assertTrue(RequestProfiler(sample_rate=0).should_profile(forced=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
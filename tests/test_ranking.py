@@ -0,0 +1,50 @@
+import unittest
+from ranking import prefilter_tracks
+
+
+def make_track(track_id, artist_id, popularity):
+    return {
+        'id': track_id,
+        'name': track_id,
+        'popularity': popularity,
+        'artists': [{'id': artist_id, 'name': artist_id}]
+    }
+
+
+class TestPrefilter(unittest.TestCase):
+    def test_ranks_by_popularity_and_genre_overlap(self):
+        tracks = [
+            make_track('niche', 'a1', 10),
+            make_track('popular', 'a2', 90),
+            make_track('crossover', 'a3', 40),
+        ]
+        track_genres = {
+            'niche': {'pop'},
+            'popular': {'pop'},
+            'crossover': {'pop', 'rock'},
+        }
+
+        selected = prefilter_tracks(tracks, track_genres, ['pop', 'rock'], top_k=2)
+
+        self.assertEqual([track['id'] for track in selected], ['crossover', 'popular'])
+
+    def test_suppresses_duplicate_artists(self):
+        tracks = [
+            make_track('hit1', 'star', 95),
+            make_track('hit2', 'star', 90),
+            make_track('other', 'newcomer', 20),
+        ]
+        track_genres = {track['id']: {'pop'} for track in tracks}
+
+        selected = prefilter_tracks(tracks, track_genres, ['pop'], top_k=2)
+        self.assertEqual([track['id'] for track in selected], ['hit1', 'other'])
+
+        selected = prefilter_tracks(tracks, track_genres, ['pop'], top_k=2, max_per_artist=2)
+        self.assertEqual([track['id'] for track in selected], ['hit1', 'hit2'])
+
+    def test_empty_pool(self):
+        self.assertEqual(prefilter_tracks([], {}, ['pop'], top_k=10), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
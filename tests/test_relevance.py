@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+from relevance import HashingEmbedder, relevance_scores, score_tracks, select_candidates
+
+
+class TestRelevanceScorer(unittest.TestCase):
+    def test_embeddings_are_normalized(self):
+        embedder = HashingEmbedder(n_features=256)
+        vectors = embedder.embed(["dancing all night long", "", "the a of"])
+
+        self.assertEqual(vectors.shape, (3, 256))
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        # Empty and stop-word-only texts embed to zero vectors
+        self.assertEqual(float(np.abs(vectors[1]).sum()), 0.0)
+        self.assertEqual(float(np.abs(vectors[2]).sum()), 0.0)
+
+    def test_relevance_scores(self):
+        scores = relevance_scores(
+            ["running fast through the city streets", "quiet rain on a sleepy afternoon"],
+            ["running", "sleepy rain"]
+        )
+
+        self.assertEqual(scores.shape, (2, 2))
+        self.assertTrue(((scores >= 0) & (scores <= 10)).all())
+        self.assertGreater(scores[0, 0], scores[1, 0])
+        self.assertGreater(scores[1, 1], scores[0, 1])
+
+    def test_score_tracks_columns(self):
+        scores = score_tracks(["happy happy joy"], "happy", "swimming", "lonely")
+
+        self.assertEqual(scores.shape, (1, 3))
+        self.assertGreater(scores[0, 0], 0)
+        self.assertEqual(scores[0, 1], 0)
+        self.assertEqual(scores[0, 2], 0)
+
+    def test_select_candidates(self):
+        # Columns are mood, activity, personal
+        scores = np.array([
+            [9, 1, 1],
+            [2, 1, 1],
+            [8, 1, 1],
+            [7, 1, 1],
+            [0, 0, 0],
+        ])
+
+        self.assertEqual(select_candidates(scores, 2, margin=0).tolist(), [0, 2])
+        # Track 3 is within the margin of the cutoff and is kept as uncertain
+        self.assertEqual(select_candidates(scores, 2, margin=1).tolist(), [0, 2, 3])
+        self.assertEqual(select_candidates(scores, 10).tolist(), [0, 1, 2, 3, 4])
+        # Track 4 has no local signal, so it is never added as uncertain
+        self.assertEqual(select_candidates(scores, 4, margin=10).tolist(), [0, 1, 2, 3])
+        self.assertEqual(select_candidates(scores, 0).tolist(), [])
+
+    def test_select_candidates_caps_uncertain(self):
+        scores = np.array([[9, 0, 0]] + [[8, 0, 0]] * 6 + [[1, 0, 0]])
+
+        # At most top_k uncertain tracks are added on top of the top_k
+        self.assertEqual(len(select_candidates(scores, 2, margin=1)), 4)
+
+    def test_select_candidates_all_ties(self):
+        # Placeholder lyrics score zero everywhere: the first top_k in prefilter order go to the LLM
+        self.assertEqual(select_candidates(np.zeros((10, 3), dtype=np.int64), 5, margin=1).tolist(), [0, 1, 2, 3, 4])
+
+        # Nonzero ties sit at the floor, so only the top_k are sent
+        self.assertEqual(select_candidates(np.full((10, 3), 4), 5, margin=1).tolist(), [0, 1, 2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
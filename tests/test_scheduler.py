@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+from scheduler import QuotaExceededError, QuotaScheduler, SchedulerBusyError
+from helpers import FakeClock
+
+
+class TestQuotaScheduler(unittest.TestCase):
+    def make_scheduler(self, credits_left=100, **kwargs):
+        self.quota = {'credits_left': credits_left}
+        self.fetches = 0
+
+        def fetch_quota():
+            self.fetches += 1
+            return dict(self.quota)
+
+        self.clock = FakeClock()
+        return QuotaScheduler(fetch_quota, cost_per_generation=10, clock=self.clock, **kwargs)
+
+    def test_caches_quota_between_refreshes(self):
+        scheduler = self.make_scheduler(refresh_interval=60)
+        for _ in range(3):
+            with scheduler.slot():
+                pass
+
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(scheduler.snapshot()['credits_left'], 70)
+
+    def test_queue_deadline_uses_injected_clock(self):
+        scheduler = self.make_scheduler(max_concurrent=1, queue_timeout=30)
+        scheduler.acquire()
+
+        # The fake clock is already past the deadline once the waiter is queued
+        self.clock.now = 100
+        original_wait = scheduler._cond.wait
+
+        def wait(timeout=None):
+            self.clock.now += 31
+            return original_wait(0)
+
+        scheduler._cond.wait = wait
+        with self.assertRaises(SchedulerBusyError):
+            scheduler.acquire()
+
+    def test_rejects_when_credits_run_out(self):
+        scheduler = self.make_scheduler(credits_left=15)
+        scheduler.acquire()
+
+        # The in-flight generation already reserves 10 of the 15 credits
+        with self.assertRaises(QuotaExceededError) as ctx:
+            scheduler.acquire()
+        self.assertEqual(ctx.exception.credits_left, 5)
+
+    def test_low_priority_keeps_reserve(self):
+        scheduler = self.make_scheduler(credits_left=25, low_priority_reserve=20)
+
+        with self.assertRaises(QuotaExceededError):
+            scheduler.acquire('low')
+        scheduler.acquire('normal')
+
+    def test_failed_generation_does_not_spend_credits(self):
+        scheduler = self.make_scheduler(credits_left=50)
+
+        with self.assertRaises(ValueError):
+            with scheduler.slot():
+                raise ValueError("upstream failed")
+
+        self.assertEqual(scheduler.snapshot()['credits_left'], 50)
+        self.assertEqual(scheduler.snapshot()['in_flight'], 0)
+
+    def test_unknown_quota_only_limits_concurrency(self):
+        scheduler = QuotaScheduler(lambda: {}, max_concurrent=1, max_queue=0)
+        scheduler.acquire()
+
+        with self.assertRaises(SchedulerBusyError):
+            scheduler.acquire()
+
+    def test_queue_serves_higher_priority_first(self):
+        scheduler = self.make_scheduler(credits_left=1000, max_concurrent=1, queue_timeout=5)
+        scheduler.acquire()
+        order = []
+
+        def wait(priority):
+            scheduler.acquire(priority)
+            order.append(priority)
+            scheduler.release()
+
+        low = threading.Thread(target=wait, args=('low',))
+        low.start()
+        time.sleep(0.05)
+        high = threading.Thread(target=wait, args=('high',))
+        high.start()
+        time.sleep(0.05)
+
+        self.assertEqual(scheduler.snapshot()['queued'], 2)
+        scheduler.release()
+        low.join()
+        high.join()
+
+        self.assertEqual(order, ['high', 'low'])
+
+    def test_queue_timeout(self):
+        # Real clock, so the queue deadline passes while waiting
+        scheduler = QuotaScheduler(lambda: {'credits_left': 100}, max_concurrent=1, queue_timeout=0.05)
+        scheduler.acquire()
+
+        with self.assertRaises(SchedulerBusyError):
+            scheduler.acquire()
+        self.assertEqual(scheduler.snapshot()['queued'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()